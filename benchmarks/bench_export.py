@@ -0,0 +1,97 @@
+# Бенчмарк выгрузки истории (export.py) для пользователя со 100 000 строк
+# результатов. Сравнивает потоковую выгрузку с наивной загрузкой всех
+# объектов в память. Использует временную БД, movies.db не трогает.
+#
+# Запуск: python benchmarks/bench_export.py [--rows 100000]
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, create_tables, User, SearchHistory, Movie, SearchResult
+from export import export_history
+
+
+def fill(rows, per_search=10, movies=5000):
+    """Синтетический пользователь с rows строками SearchResult"""
+    create_tables()
+    user = User.create(telegram_id=1, username='bench')
+    now = datetime.datetime.now()
+    with db.atomic():
+        Movie.insert_many(
+            [{'kp_id': i, 'name': f'Фильм {i}', 'description': 'Описание ' * 30, 'rating_kp': 7.5,
+              'year': 2000 + i % 25, 'genres': 'драма, комедия'} for i in range(1, movies + 1)]
+        ).execute()
+    searches = rows // per_search
+    for start in range(0, searches, 1000):
+        with db.atomic():
+            SearchHistory.insert_many(
+                [{'user': user, 'search_type': 'Поиск по названию', 'query': f'запрос {i}',
+                  'genre': 'драма', 'results_count': per_search,
+                  'created_at': now + datetime.timedelta(seconds=i)}
+                 for i in range(start, min(start + 1000, searches))]
+            ).execute()
+    search_ids = [search_id for (search_id,) in SearchHistory.select(SearchHistory.id).tuples()]
+    for start in range(0, len(search_ids), 1000):
+        with db.atomic():
+            SearchResult.insert_many(
+                [{'search': search_id, 'movie': (search_id * per_search + j) % movies + 1,
+                  'is_watched': j == 0}
+                 for search_id in search_ids[start:start + 1000] for j in range(per_search)]
+            ).execute()
+    return user
+
+
+def naive_export(user):
+    """Наивный вариант: все строки как объекты моделей в памяти"""
+    results = list(SearchResult
+                   .select(SearchResult, SearchHistory, Movie)
+                   .join(SearchHistory)
+                   .switch(SearchResult)
+                   .join(Movie)
+                   .where(SearchHistory.user == user))
+    return len(results)
+
+
+def measure(name, function):
+    # Время и память меряем отдельными прогонами: tracemalloc сильно замедляет код
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name}: {elapsed:.2f} c, пик памяти {peak / 1024 / 1024:.1f} МБ")
+    return result
+
+
+def streaming_export(user, export_format):
+    file, count = export_history(user, export_format)
+    with file:
+        size = os.fstat(file.fileno()).st_size
+    return count, size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db.init(os.path.join(directory, 'bench.db'), pragmas={'journal_mode': 'wal'})
+        started = time.perf_counter()
+        user = fill(options.rows)
+        print(f"Подготовка {options.rows} строк: {time.perf_counter() - started:.1f} c")
+
+        for export_format in ('csv', 'jsonl'):
+            count, size = measure(f"Потоковая выгрузка {export_format}",
+                                  lambda: streaming_export(user, export_format))
+            print(f"  строк: {count}, размер файла: {size / 1024 / 1024:.1f} МБ")
+        measure("Наивная загрузка в память", lambda: naive_export(user))
+        db.close()
@@ -0,0 +1,65 @@
+# Бенчмарк движка рекомендаций (recommender.py) на синтетическом каталоге.
+# Каталог заполняется напрямую через add_rows, без БД и без API.
+#
+# Запуск: python benchmarks/bench_recommender.py [--movies 100000]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommender import Recommender
+
+GENRES = [
+    "боевик", "комедия", "фантастика", "ужасы", "триллер", "драма",
+    "мелодрама", "детектив", "фэнтези", "приключения", "аниме", "мультфильм",
+    "криминал", "военный", "история", "биография", "документальный", "семейный",
+]
+
+
+def make_rows(count, start=0):
+    """Синтетические фильмы: (kp_id, жанры, год, рейтинг)"""
+    rng = random.Random(start)
+    return [
+        (
+            start + i + 1,
+            ', '.join(rng.sample(GENRES, rng.randint(1, 3))),
+            rng.choice([None, rng.randint(1950, 2025)]),
+            rng.choice([None, round(rng.uniform(1, 10), 1)]),
+        )
+        for i in range(count)
+    ]
+
+
+def measure(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--history', type=int, default=200, help="Фильмов в истории пользователя")
+    parser.add_argument('--repeat', type=int, default=50)
+    options = parser.parse_args()
+
+    engine = Recommender()
+    started = time.perf_counter()
+    engine.add_rows(make_rows(options.movies))
+    print(f"Загрузка {options.movies} фильмов: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    rng = random.Random(1)
+    weights = {rng.randint(1, options.movies): rng.choice([1.0, 3.0]) for _ in range(options.history)}
+
+    elapsed, profile = measure(lambda: engine.build_profile(weights, ["драма"]), options.repeat)
+    print(f"Профиль пользователя ({len(weights)} фильмов): {elapsed:.2f} мс")
+    elapsed, top = measure(lambda: engine.top(*profile, exclude=weights, limit=10), options.repeat)
+    print(f"Оценка всего каталога и top-10: {elapsed:.2f} мс")
+
+    # Догрузка новых фильмов не пересобирает матрицы целиком
+    elapsed, _ = measure(lambda: engine.add_rows(make_rows(10, engine.size)), options.repeat)
+    print(f"Добавление 10 новых фильмов: {elapsed:.2f} мс")
@@ -0,0 +1,80 @@
+# Бенчмарк масштабирования супервизора (sharding.py) на 1, 2, 4 и 8 процессах.
+# Вместо обработчиков main.py (им нужны Telegram и Kinopoisk) каждый шард
+# выполняет синтетическую CPU-нагрузку, сопоставимую с разбором обновления,
+# форматированием ответа и работой с ORM.
+#
+# Запуск: python benchmarks/bench_sharding.py [--updates 4000] [--chats 500]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import ShardSupervisor
+
+
+def make_update(update_id, chat_id):
+    """Сырое обновление в формате Bot API"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'bench'},
+            'chat': {'id': chat_id, 'type': 'private'},
+            'date': 0,
+            'text': 'Поиск по названию',
+        }
+    }
+
+
+def busy_worker(shard, updates, acks, ready, done, work):
+    """Шард бенчмарка: на каждое обновление тратит work итераций CPU"""
+    ready.put(shard)
+    handled = 0
+    while True:
+        update = updates.get()
+        if update is None:
+            break
+        total = 0
+        for i in range(work):
+            total += i * i
+        acks.put(update['update_id'])
+        handled += 1
+    done.put(handled)
+
+
+def run(workers, updates, chats, work):
+    import multiprocessing
+    ctx = multiprocessing.get_context('spawn')
+    ready, done = ctx.Queue(), ctx.Queue()
+    supervisor = ShardSupervisor(workers, target=busy_worker, args=(ready, done, work))
+    supervisor.start()
+    for _ in range(workers):
+        ready.get()  # Ждем запуска всех процессов, чтобы не мерить spawn
+
+    started = time.perf_counter()
+    for update_id in range(updates):
+        supervisor.dispatch(make_update(update_id, 100000 + update_id % chats))
+    supervisor.stop(timeout=600)
+    elapsed = time.perf_counter() - started
+
+    handled = sum(done.get() for _ in range(workers))
+    assert handled == updates, f"обработано {handled} из {updates}"
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=4000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--work', type=int, default=50000, help="Итераций CPU на обновление")
+    options = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()}, обновлений: {options.updates}, чатов: {options.chats}")
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        elapsed = run(workers, options.updates, options.chats, options.work)
+        baseline = baseline or elapsed
+        print(f"{workers} процесс(ов): {elapsed:.2f} c, "
+              f"{options.updates / elapsed:.0f} обн/с, ускорение x{baseline / elapsed:.2f}")
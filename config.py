@@ -9,3 +9,6 @@ load_dotenv()
 # Получаю токены из переменных окружения
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')  # Токен моего Telegram бота
 API_KEY = os.getenv('KINOPOISK_API_KEY')  # API ключ для доступа к Kinopoisk
+
+# Сколько запросов подробностей о фильмах можно делать заранее (в фоне) за сутки
+DETAILS_PREFETCH_LIMIT = int(os.getenv('DETAILS_PREFETCH_LIMIT', 100))
@@ -0,0 +1,108 @@
+# Импорт необходимых библиотек
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+
+from models import Movie, SearchHistory, SearchResult
+
+
+# --- ЭКСПОРТ ИСТОРИИ ---
+# Строки читаются из БД курсором через .iterator() и сразу пишутся во
+# временный файл, поэтому память не зависит от размера истории.
+
+# Столбцы выгрузки (в порядке полей запроса ниже)
+EXPORT_FIELDS = (
+    'searched_at', 'search_type', 'query', 'min_rating', 'max_rating', 'budget_type', 'genre',
+    'kp_id', 'name', 'year', 'rating_kp', 'genres', 'is_watched'
+)
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Боту можно отправлять файлы до 50 МБ (берем с запасом на заголовки запроса)
+UPLOAD_LIMIT = 50 * 1000 * 1000
+
+
+def history_rows(user):
+    """Генератор строк истории пользователя: поиск + найденный фильм"""
+    query = (SearchResult
+             .select(
+                 SearchHistory.created_at, SearchHistory.search_type, SearchHistory.query,
+                 SearchHistory.min_rating, SearchHistory.max_rating, SearchHistory.budget_type,
+                 SearchHistory.genre, Movie.kp_id, Movie.name, Movie.year, Movie.rating_kp,
+                 Movie.genres, SearchResult.is_watched
+             )
+             .join(SearchHistory)
+             .switch(SearchResult)
+             .join(Movie)
+             .where(SearchHistory.user == user)
+             .order_by(SearchHistory.created_at, SearchResult.id)
+             .tuples())
+    # iterator() не кэширует строки в объекте запроса
+    for row in query.iterator():
+        yield (row[0].isoformat(sep=' ', timespec='seconds'),) + row[1:]
+
+
+def write_export(rows, file, export_format):
+    """Пишет строки в текстовый файл в формате csv или jsonl, возвращает их количество"""
+    count = 0
+    if export_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            file.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+            file.write('\n')
+            count += 1
+    return count
+
+
+def export_history(user, export_format='csv'):
+    """
+    Выгружает историю пользователя во временный файл
+    Возвращает (файл, количество строк). Файл бинарный, открыт на чтение
+    с начала (для send_document) и удаляется при закрытии.
+    """
+    file = tempfile.TemporaryFile()
+    try:
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        count = write_export(history_rows(user), text, export_format)
+        text.flush()
+        text.detach()  # Отвязываем обертку, чтобы она не закрыла файл
+    except Exception:
+        file.close()
+        raise
+    file.seek(0)
+    return file, count
+
+
+def fit_upload_limit(file, limit=UPLOAD_LIMIT):
+    """
+    Готовит файл выгрузки к отправке в Telegram: если он больше limit, сжимает gzip
+    Возвращает (файл, сжат ли он) или (None, False), если не помещается и сжатый.
+    Когда возвращается другой файл (или None), исходный закрывается.
+    """
+    size = file.seek(0, io.SEEK_END)
+    file.seek(0)
+    if size <= limit:
+        return file, False
+    compressed = tempfile.TemporaryFile()
+    try:
+        # GzipFile не закрывает переданный fileobj
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as archive:
+            shutil.copyfileobj(file, archive)
+    except Exception:
+        compressed.close()
+        raise
+    finally:
+        file.close()
+    if compressed.tell() > limit:
+        compressed.close()
+        return None, False
+    compressed.seek(0)
+    return compressed, True
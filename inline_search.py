@@ -0,0 +1,192 @@
+# Импорт необходимых библиотек
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from peewee import fn
+
+from models import Movie
+
+
+# --- INLINE ПОИСК (@bot название) ---
+# Inline-запросы приходят на каждое нажатие клавиши. Чтобы не тратить квоту
+# Kinopoisk, сначала отвечаем из кэша префиксов и локальной таблицы Movie,
+# а в API идем только когда пользователь перестал печатать (debounce).
+class InlineSearch:
+    def __init__(self, api, answer, delay=0.7, limit=10, min_api_length=2,
+                 cache_size=2000, cache_ttl=3600, api_workers=4):
+        """
+        Конструктор класса InlineSearch
+        api: Экземпляр KinopoiskAPI
+        answer: Функция answer(query_id, movies, cache_time) для ответа в Telegram
+        delay: Пауза в секундах, после которой запрос считается "устоявшимся"
+        api_workers: Сколько запросов к API может выполняться одновременно
+        """
+        self.api = api
+        self.answer = answer
+        self.delay = delay
+        self.limit = limit  # Сколько фильмов показывать в ответе
+        self.min_api_length = min_api_length  # Более короткие запросы в API не отправляем
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl  # Время жизни записи кэша в секундах
+        # запрос -> (время, список фильмов из API, полный ли список), LRU.
+        # Список полный, если API вернул меньше limit фильмов: тогда для более
+        # длинного запроса API не найдет ничего сверх отфильтрованного списка
+        self.cache = OrderedDict()
+        self.pending = {}  # user_id -> (срок, query_id, запрос, локальные результаты)
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.executor = ThreadPoolExecutor(max_workers=api_workers, thread_name_prefix="inline")
+        # Статистика ответов. superseded - запросы, замененные новым нажатием
+        # до обращения к API: им отвечаем локальными результатами
+        self.stats = {'cache': 0, 'prefix': 0, 'local': 0, 'api': 0, 'api_errors': 0, 'superseded': 0}
+        # Один поток-планировщик отправляет в API устоявшиеся запросы
+        self.scheduler = threading.Thread(target=self._schedule, name="inline-scheduler", daemon=True)
+        self.scheduler.start()
+
+    @staticmethod
+    def movie_id(movie):
+        # Фильм может быть словарем из API или объектом Movie из БД
+        return movie.kp_id if isinstance(movie, Movie) else movie.get('id')
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.casefold().split())
+
+    def handle(self, query_id, user_id, text):
+        """Обработка очередного inline-запроса (вызывается на каждое нажатие)"""
+        query = self.normalize(text)
+        with self.lock:
+            # Новое нажатие заменяет отложенный запрос пользователя
+            previous = self.pending.pop(user_id, None)
+            # 1. Точное совпадение в кэше
+            entry = self._cache_get(query)
+            if entry is None:
+                # 2. Самый длинный закэшированный префикс
+                movies, complete = self._prefix_results(query)
+        if previous is not None:
+            # Замененному запросу отвечаем уже найденным локально, без API
+            _, previous_id, _, previous_movies = previous
+            self._answer(previous_id, previous_movies, 5, 'superseded')
+        if entry is not None:
+            self._answer(query_id, entry[0], 300, 'cache')
+            return
+
+        # 3. Локальный каталог Movie
+        movies = self._with_local(query, movies)
+        if complete and movies:
+            # Отфильтрованный полный список префикса - окончательный ответ.
+            # Пустой результат окончательным не считаем: Telegram закэширует его на 300 с
+            self._answer(query_id, movies, 300, 'prefix')
+            return
+        if len(movies) >= self.limit or len(query) < self.min_api_length:
+            # Локальных результатов достаточно (или запрос слишком короткий для API).
+            # Короткий cache_time: позже на этот запрос может найтись больше в API
+            self._answer(query_id, movies, 30, 'local')
+            return
+
+        # 4. В API идет только запрос, после которого была пауза в наборе. Если
+        # раньше придет новое нажатие, этот запрос получит локальный ответ
+        with self.condition:
+            self.pending[user_id] = (time.monotonic() + self.delay, query_id, query, movies)
+            self.condition.notify()
+
+    def _schedule(self):
+        """Поток-планировщик: передает в API запросы, после которых была пауза"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                for user_id in [user_id for user_id, (deadline, *_) in self.pending.items()
+                                if deadline <= now]:
+                    _, query_id, query, movies = self.pending.pop(user_id)
+                    self.executor.submit(self._fetch, query_id, query, movies)
+                timeout = None
+                if self.pending:
+                    timeout = min(deadline for deadline, *_ in self.pending.values()) - now
+                self.condition.wait(timeout)
+
+    def _fetch(self, query_id, query, local_movies):
+        """Запрос к API для устоявшегося запроса"""
+        try:
+            movies = self.api.search_by_name(query, self.limit)
+        except Exception as e:
+            # Сетевая ошибка: отвечаем тем, что есть локально
+            print(f"Error: {e}")
+            with self.lock:
+                self.stats['api_errors'] += 1
+            self._answer(query_id, local_movies, 30, 'api')
+            return
+        with self.lock:
+            if movies:  # Пустой список может означать ошибку API, его не кэшируем
+                self._cache_put(query, movies)
+        # Дополняем ответ фильмами из локального каталога, которых нет в выдаче API
+        seen = {movie.get('id') for movie in movies}
+        movies = movies + [movie for movie in local_movies if self.movie_id(movie) not in seen]
+        self._answer(query_id, movies[:self.limit], 300, 'api')
+
+    def _answer(self, query_id, movies, cache_time, source):
+        self.answer(query_id, movies, cache_time)
+        with self.lock:
+            self.stats[source] += 1
+            if source == 'api':
+                self.report()
+
+    def _cache_get(self, query):
+        entry = self.cache.get(query)
+        if entry is None:
+            return None
+        created, movies, complete = entry
+        if time.monotonic() - created > self.cache_ttl:
+            del self.cache[query]
+            return None
+        self.cache.move_to_end(query)
+        return movies, complete
+
+    def _cache_put(self, query, movies):
+        self.cache[query] = (time.monotonic(), movies, len(movies) < self.limit)
+        self.cache.move_to_end(query)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)  # Удаляем самую старую запись
+
+    def _prefix_results(self, query):
+        """Фильмы из кэша самого длинного префикса, подходящие под запрос"""
+        for length in range(len(query) - 1, 0, -1):
+            entry = self._cache_get(query[:length])
+            if entry is not None:
+                cached, complete = entry
+                movies = [movie for movie in cached if self._matches(movie, query)]
+                return movies[:self.limit], complete
+        return [], False
+
+    @staticmethod
+    def _matches(movie, query):
+        # API ищет и по оригинальному названию, поэтому проверяем все названия
+        names = (movie.get('name'), movie.get('alternativeName'), movie.get('enName'))
+        return any(query in name.casefold() for name in names if name)
+
+    def _with_local(self, query, movies):
+        """Дополняет ответ фильмами из таблицы Movie"""
+        if len(movies) >= self.limit or not query:
+            return movies[:self.limit]
+        seen = {self.movie_id(movie) for movie in movies}
+        local = (Movie
+                 .select()
+                 .where(fn.casefold(Movie.name).contains(query))
+                 .order_by(Movie.rating_kp.desc())
+                 .limit(self.limit))
+        movies = movies + [movie for movie in local if movie.kp_id not in seen]
+        return movies[:self.limit]
+
+    def served_locally_ratio(self):
+        """Доля отвеченных inline-запросов, обслуженных без обращения к API"""
+        local = sum(self.stats[key] for key in ('cache', 'prefix', 'local', 'superseded'))
+        answered = local + self.stats['api']
+        if not answered:
+            return 0.0
+        return local / answered
+
+    def report(self):
+        # Периодически выводим статистику в консоль
+        if self.stats['api'] % 50 == 0:
+            print(f"Inline: {self.stats}, без API: {self.served_locally_ratio():.1%} отвеченных")
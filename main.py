@@ -1,12 +1,20 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import telebot
 from telebot import types
-from config import TOKEN, API_KEY
-from models import Movie, SearchResult, SearchHistory, User, create_tables
+from config import TOKEN, API_KEY, DETAILS_PREFETCH_LIMIT
+from models import db, Movie, SearchResult, SearchHistory, User, create_tables
 from kinopoisk_api import KinopoiskAPI
+from export import export_history, fit_upload_limit, EXPORT_FORMATS, UPLOAD_LIMIT
+from inline_search import InlineSearch
+from movie_details import DetailCache
+from recommender import Recommender
 from utils import (
     create_main_keyboard, create_count_keyboard,
     create_genre_keyboard, create_watch_keyboard,
-    format_movie_info
+    create_details_keyboard, create_similar_keyboard,
+    format_movie_info, format_movie_details, create_inline_result
 )
 
 # Инициализация бота и API
@@ -16,6 +24,19 @@ kp_api = KinopoiskAPI(API_KEY)  # Создание экземпляра API Kino
 # Создание таблиц БД при запуске
 create_tables()
 
+# Кэш подробной информации о фильмах (кнопка "Подробнее")
+detail_cache = DetailCache(kp_api, prefetch_limit=DETAILS_PREFETCH_LIMIT)
+
+# Движок рекомендаций: каталог загружается в фоне, чтобы не задерживать запуск
+recommender = Recommender()
+threading.Thread(target=recommender.refresh, daemon=True).start()
+
+# Выгрузка истории идет в отдельных потоках, чтобы не занимать потоки обработчиков.
+# Несколько потоков: длинная выгрузка одного пользователя не задерживает остальных
+export_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="export")
+exporting_users = set()  # Пользователи, для которых файл уже готовится
+exporting_lock = threading.Lock()  # Обработчики telebot работают в нескольких потоках
+
 # Словарь для хранения состояний пользователей
 user_states = {}
 
@@ -42,38 +63,41 @@ def get_or_create_user(telegram_id):
 
 def save_search_history(user, state):
     """Сохраняет историю поиска и результаты в БД"""
-    # Создание записи о поисковом запросе
-    search = SearchHistory.create(
-        user=user,
-        search_type=state.search_type,
-        query=state.search_query,
-        min_rating=state.min_rating,
-        max_rating=state.max_rating,
-        budget_type=state.budget_type,
-        genre=state.genre,
-        results_count=state.results_count
-    )
-    # Сохранение каждого найденного фильма
-    for movie_data in state.search_results:
-        # Создание или обновление информации о фильме
-        movie, created = Movie.get_or_create(
-            kp_id=movie_data.get('id'),
-            defaults={
-                'name': movie_data.get('name'),
-                'description': movie_data.get('description'),
-                'rating_kp': movie_data.get('rating', {}).get('kp'),
-                'year': movie_data.get('year'),
-                'genres': ', '.join([g.get('name', '') for g in movie_data.get('genres', [])]),
-                'age_rating': movie_data.get('ageRating'),
-                'poster_url': movie_data.get('poster', {}).get('url') if movie_data.get('poster') else None
-            }
-        )
-        # Связывание фильма с поисковым запросом
-        SearchResult.create(
-            search=search,
-            movie=movie,
-            is_watched=False  # По умолчанию помечается как непросмотренный
+    # Одна транзакция на весь поиск: IMMEDIATE сразу берет блокировку записи,
+    # чтобы параллельные процессы ждали ее по busy_timeout, а не получали ошибку
+    with db.atomic('IMMEDIATE'):
+        # Создание записи о поисковом запросе
+        search = SearchHistory.create(
+            user=user,
+            search_type=state.search_type,
+            query=state.search_query,
+            min_rating=state.min_rating,
+            max_rating=state.max_rating,
+            budget_type=state.budget_type,
+            genre=state.genre,
+            results_count=state.results_count
         )
+        # Сохранение каждого найденного фильма
+        for movie_data in state.search_results:
+            # Создание или обновление информации о фильме
+            movie, created = Movie.get_or_create(
+                kp_id=movie_data.get('id'),
+                defaults={
+                    'name': movie_data.get('name'),
+                    'description': movie_data.get('description'),
+                    'rating_kp': movie_data.get('rating', {}).get('kp'),
+                    'year': movie_data.get('year'),
+                    'genres': ', '.join([g.get('name', '') for g in movie_data.get('genres', [])]),
+                    'age_rating': movie_data.get('ageRating'),
+                    'poster_url': movie_data.get('poster', {}).get('url') if movie_data.get('poster') else None
+                }
+            )
+            # Связывание фильма с поисковым запросом
+            SearchResult.create(
+                search=search,
+                movie=movie,
+                is_watched=False  # По умолчанию помечается как непросмотренный
+            )
     return search
 
 # Обработчики команд
@@ -98,7 +122,10 @@ def handel_help(message):
         "<b>Поиск по названию</b> - найти фильм по названию\n"
         "<b>Поиск по рейтингу</b> - найти фильмы в указанном диапазоне рейтинга\n"
         "<b>Поиск по бюджету</b> - найти фильмы с высоким или низким бюджетом\n"
-        "<b>История поиска</b> - просмотреть историю ваших запросов\n\n"
+        "<b>История поиска</b> - просмотреть историю ваших запросов\n"
+        "<b>Рекомендации</b> - подобрать фильмы по вашим поискам и просмотрам\n"
+        "<b>@бот название</b> - inline поиск в любом чате\n"
+        "<b>/export</b> - скачать историю поиска (/export csv или /export jsonl)\n\n"
         "После поиска вы можете отмечать фильмы как просмотренные."
     )
     bot.send_message(
@@ -128,6 +155,63 @@ def show_history_menu(chat_id, user):
     )
 
 
+@bot.message_handler(commands=["export"])
+def handel_export(message):
+    """Выгрузка истории поиска и просмотренных фильмов файлом"""
+    args = message.text.split()[1:]
+    export_format = args[0].lower() if args else 'csv'
+    if export_format not in EXPORT_FORMATS:
+        bot.send_message(message.chat.id, "Укажите формат: /export csv или /export jsonl")
+        return
+    # Проверка и добавление под одной блокировкой: два быстрых /export не пройдут оба
+    with exporting_lock:
+        if message.from_user.id in exporting_users:
+            bot.send_message(message.chat.id, "Файл с историей уже готовится, подождите")
+            return
+        exporting_users.add(message.from_user.id)
+
+    try:
+        user = get_or_create_user(message.from_user.id)
+        bot.send_message(message.chat.id, "Готовлю файл с вашей историей...")
+        export_executor.submit(send_export, message.chat.id, user, export_format)
+    except Exception:
+        # Выгрузка не запущена - снимаем отметку, иначе пользователь не сможет повторить
+        with exporting_lock:
+            exporting_users.discard(message.from_user.id)
+        raise
+
+
+def send_export(chat_id, user, export_format):
+    """Формирует файл выгрузки и отправляет его пользователю"""
+    try:
+        file, count = export_history(user, export_format)
+        if not count:
+            file.close()
+            bot.send_message(chat_id, "Ваша история поиска пуста")
+            return
+        # Telegram не примет файл больше лимита: большие выгрузки сжимаем
+        file, compressed = fit_upload_limit(file)
+        if file is None:
+            bot.send_message(
+                chat_id,
+                f"История слишком большая для отправки в Telegram даже в сжатом виде "
+                f"(лимит {UPLOAD_LIMIT // 1000000} МБ)"
+            )
+            return
+        with file:
+            bot.send_document(
+                chat_id,
+                file,
+                visible_file_name=f"history.{export_format}" + (".gz" if compressed else ""),
+                caption=f"Записей в истории: {count}" + (" (сжато gzip)" if compressed else "")
+            )
+    except Exception as e:
+        bot.send_message(chat_id, f"Не удалось выгрузить историю: {e}")
+    finally:
+        with exporting_lock:
+            exporting_users.discard(user.telegram_id)
+
+
 @bot.message_handler(func=lambda message: message.text == "Помощь")
 def handel_help_button(message):
     """
@@ -204,7 +288,7 @@ def show_search_result(call):
         # Форматируем информацию о фильме
         text, poster_url = format_movie_info(result.movie)
         # Создаем inline-клавиатуру с кнопкой "Отметить просмотренным"
-        keyboard = create_watch_keyboard(result.id)
+        keyboard = create_watch_keyboard(result.id, result.movie.kp_id)
         if poster_url:
             # Если есть постер, отправляем фото с описанием
             bot.send_photo(
@@ -222,6 +306,8 @@ def show_search_result(call):
                 parse_mode="HTML",
                 reply_markup=keyboard
             )
+    # Заранее загружаем подробности показанных фильмов
+    detail_cache.prefetch([result.movie.kp_id for result in results])
     # Подтверждаем обработку callback-запроса
     bot.answer_callback_query(call.id)
 
@@ -242,6 +328,77 @@ def mark_as_watched(call):
         show_alert=False  # Всплывающее уведомление (не блокирующее)
     )
 
+@bot.message_handler(commands=["recommend"])
+def handel_recommend(message):
+    """Рекомендации по истории поиска и просмотренным фильмам"""
+    user = get_or_create_user(message.from_user.id)
+    movies = recommender.recommend(user)
+    if not movies:
+        bot.send_message(
+            message.chat.id,
+            "Пока нечего порекомендовать. Найдите несколько фильмов и отметьте просмотренные"
+        )
+        return
+
+    bot.send_message(message.chat.id, "Вам может понравиться:")
+    for movie in movies:
+        text, poster_url = format_movie_info(movie)
+        keyboard = create_details_keyboard(movie.kp_id)
+        if poster_url:
+            bot.send_photo(
+                message.chat.id,
+                poster_url,
+                caption=text,
+                parse_mode="HTML",
+                reply_markup=keyboard
+            )
+        else:
+            bot.send_message(
+                message.chat.id,
+                text,
+                parse_mode="HTML",
+                reply_markup=keyboard
+            )
+    detail_cache.prefetch([movie.kp_id for movie in movies])
+
+
+@bot.message_handler(func=lambda message: message.text == "Рекомендации")
+def handel_recommend_button(message):
+    handel_recommend(message)
+
+# Обработчик кнопки "Подробнее"
+@bot.callback_query_handler(func=lambda call: call.data.startswith("details_"))
+def show_movie_details(call):
+    try:
+        kp_id = int(call.data.split("_")[1])
+    except ValueError:
+        # Кнопка без корректного id (например, от старых сообщений)
+        bot.answer_callback_query(call.id, "Не удалось загрузить подробности", show_alert=True)
+        return
+    try:
+        details = detail_cache.get(kp_id)  # Из кэша сразу, устаревшее обновится в фоне
+    except Exception as e:
+        # Нет в кэше, а запрос к API не удался
+        print(f"Error: {e}")
+        details = None
+    if details is None:
+        bot.answer_callback_query(call.id, "Не удалось загрузить подробности", show_alert=True)
+        return
+    # У карточек из inline-режима нет сообщения в чате с ботом, отвечаем в личку
+    chat_id = call.message.chat.id if call.message else call.from_user.id
+    try:
+        bot.send_message(
+            chat_id,
+            format_movie_details(details),
+            parse_mode="HTML",
+            reply_markup=create_similar_keyboard(details)
+        )
+    except telebot.apihelper.ApiTelegramException:
+        # Пользователь еще не начинал диалог с ботом
+        bot.answer_callback_query(call.id, "Откройте чат с ботом, чтобы увидеть подробности", show_alert=True)
+        return
+    bot.answer_callback_query(call.id)
+
 # возврат в основное меню
 @bot.message_handler(func=lambda message: message.text == "Назад в меню")
 def back_to_menu(message):
@@ -485,21 +642,26 @@ def perform_search(message):
     # Вывод каждого фильма
     for movie in results:
         text, poster_url = format_movie_info(movie)
+        keyboard = create_details_keyboard(movie.get('id'))
 
         if poster_url:
             bot.send_photo(
                 message.chat.id,
                 poster_url,
                 caption=text,
-                parse_mode='HTML'
+                parse_mode='HTML',
+                reply_markup=keyboard
             )
         else:
             # Отправка без постера
             bot.send_message(
                 message.chat.id,
                 text,
-                parse_mode='HTML'
+                parse_mode='HTML',
+                reply_markup=keyboard
             )
+    # Заранее загружаем подробности найденных фильмов
+    detail_cache.prefetch([movie.get('id') for movie in results])
 
     # Завершение поиска
     bot.send_message(
@@ -508,6 +670,30 @@ def perform_search(message):
         reply_markup=create_main_keyboard()
     )
 
+def answer_inline(query_id, movies, cache_time):
+    """Отправка ответа на inline-запрос"""
+    try:
+        bot.answer_inline_query(
+            query_id,
+            [create_inline_result(movie) for movie in movies],
+            cache_time=cache_time,  # Сколько секунд Telegram может кэшировать ответ
+            is_personal=False  # Ответ одинаков для всех пользователей
+        )
+    except telebot.apihelper.ApiTelegramException as e:
+        # Запрос мог устареть, пока мы ждали паузу в наборе
+        print(f"Error: {e}")
+
+
+# Debounce и кэширование inline-запросов
+inline_search = InlineSearch(kp_api, answer_inline)
+
+
+# Обработчик inline-запросов (@bot название в любом чате)
+@bot.inline_handler(func=lambda query: len(query.query) > 0)
+def handle_inline_query(query):
+    inline_search.handle(query.id, query.from_user.id, query.query)
+
+
 @bot.message_handler(func=lambda message: True)
 def handle_unknown(message):
     """
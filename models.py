@@ -4,7 +4,18 @@ import datetime
 
 # --- БАЗА ДАННЫХ ---
 # Создаем соединение с SQLite базой данных
-db = SqliteDatabase('movies.db')
+# WAL позволяет читать параллельно с записью, а busy_timeout заставляет
+# процессы (см. sharding.py) ждать освобождения блокировки, а не падать
+db = SqliteDatabase('movies.db', pragmas={
+    'journal_mode': 'wal',
+    'busy_timeout': 5000,  # мс
+})
+
+# Регистрируем в SQLite функцию casefold: встроенные LOWER/LIKE
+# не учитывают регистр кириллицы, а названия фильмов в основном русские
+@db.func('casefold')
+def casefold(value):
+    return value.casefold() if value else value
 
 # Базовый класс модели для наследования
 class BaseModel(Model):
@@ -46,10 +57,21 @@ class SearchResult(BaseModel):
     movie = ForeignKeyField(Movie)  # Связь с фильмами и сериалами
     is_watched = BooleanField(default=False)  # отметка о просмотре
 
+# Кэш подробной информации о фильмах (ответы get_movie_details)
+class MovieDetails(BaseModel):
+    kp_id = IntegerField(unique=True)  # ID фильма в Kinopoisk API
+    data = TextField()  # JSON с нужными полями ответа API
+    updated_at = DateTimeField(default=datetime.datetime.now)  # Когда данные получены из API
+
+# Суточный счетчик фоновых загрузок подробностей (общий для всех процессов)
+class PrefetchQuota(BaseModel):
+    day = DateField(unique=True)  # Дата
+    used = IntegerField(default=0)  # Сколько запросов к API уже сделано
+
 # функция для создания таблицы
 def create_tables():
     with db:
-        db.create_tables([User, SearchHistory, Movie, SearchResult])
+        db.create_tables([User, SearchHistory, Movie, SearchResult, MovieDetails, PrefetchQuota])
 
 if __name__ == '__main__':
     create_tables()
@@ -0,0 +1,109 @@
+# Импорт необходимых библиотек
+import datetime
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db, MovieDetails, PrefetchQuota
+
+
+# --- КЭШ ПОДРОБНОЙ ИНФОРМАЦИИ О ФИЛЬМАХ ---
+# Работает по схеме stale-while-revalidate: сохраненные данные отдаются
+# сразу, а если они старше TTL - обновляются из API в фоне.
+class DetailCache:
+    # Поля ответа API, которые нужны для карточки (полный ответ занимает десятки КБ)
+    FIELDS = (
+        'id', 'name', 'alternativeName', 'year', 'description', 'rating', 'ageRating',
+        'movieLength', 'seriesLength', 'genres', 'countries', 'persons', 'similarMovies', 'poster'
+    )
+
+    def __init__(self, api, ttl=datetime.timedelta(days=7), prefetch_limit=100, prefetch_per_search=5):
+        """
+        Конструктор класса DetailCache
+        api: Экземпляр KinopoiskAPI
+        ttl: Через сколько данные считаются устаревшими
+        prefetch_limit: Сколько фоновых загрузок можно сделать за сутки (на все процессы)
+        prefetch_per_search: Сколько фильмов из одной выдачи загружать заранее
+        """
+        self.api = api
+        self.ttl = ttl
+        self.prefetch_limit = prefetch_limit
+        self.prefetch_per_search = prefetch_per_search
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="details")
+        self.in_flight = set()  # kp_id, которые уже загружаются
+        self.lock = threading.Lock()
+
+    def get(self, kp_id):
+        """Подробности о фильме: из кэша (с фоновым обновлением) или из API"""
+        row = MovieDetails.get_or_none(MovieDetails.kp_id == kp_id)
+        if row is None:
+            return self.fetch(kp_id)
+        if datetime.datetime.now() - row.updated_at > self.ttl:
+            self._submit(kp_id)  # Устаревшие данные отдаем сразу, обновляем в фоне
+        return json.loads(row.data)
+
+    def fetch(self, kp_id):
+        """Загрузка из API и сохранение в кэш"""
+        data = self.api.get_movie_details(kp_id)
+        if data is None:
+            return None
+        data = {key: data[key] for key in self.FIELDS if key in data}
+        MovieDetails.insert(
+            kp_id=kp_id,
+            data=json.dumps(data, ensure_ascii=False),
+            updated_at=datetime.datetime.now()
+        ).on_conflict_replace().execute()
+        return data
+
+    def prefetch(self, kp_ids):
+        """Фоновая загрузка подробностей для только что показанной выдачи"""
+        kp_ids = list(dict.fromkeys(kp_id for kp_id in kp_ids if kp_id))[:self.prefetch_per_search]
+        if not kp_ids:
+            return
+        cached = {row.kp_id for row in
+                  MovieDetails.select(MovieDetails.kp_id)
+                  .where(MovieDetails.kp_id.in_(kp_ids) &
+                         (MovieDetails.updated_at > datetime.datetime.now() - self.ttl))}
+        # Проверка и резервирование под одной блокировкой, чтобы дубликаты не тратили квоту
+        with self.lock:
+            candidates = [kp_id for kp_id in kp_ids if kp_id not in cached and kp_id not in self.in_flight]
+            self.in_flight.update(candidates)
+        granted = 0
+        try:
+            granted = self._take_quota(len(candidates)) if candidates else 0
+        except Exception as e:
+            print(f"Error: {e}")
+        with self.lock:
+            self.in_flight.difference_update(candidates[granted:])  # На них квоты не хватило
+        for kp_id in candidates[:granted]:
+            self.executor.submit(self._refresh, kp_id)
+
+    def _take_quota(self, count):
+        """Резервирует до count фоновых загрузок из суточной квоты, возвращает сколько выдано"""
+        # Счетчик хранится в БД: квота общая для всех процессов и переживает перезапуски
+        with db.atomic('IMMEDIATE'):
+            quota, created = PrefetchQuota.get_or_create(day=datetime.date.today())
+            granted = max(0, min(count, self.prefetch_limit - quota.used))
+            if granted:
+                (PrefetchQuota
+                 .update(used=PrefetchQuota.used + granted)
+                 .where(PrefetchQuota.id == quota.id)
+                 .execute())
+        return granted
+
+    def _submit(self, kp_id):
+        # Не запускаем вторую загрузку того же фильма, пока идет первая
+        with self.lock:
+            if kp_id in self.in_flight:
+                return
+            self.in_flight.add(kp_id)
+        self.executor.submit(self._refresh, kp_id)
+
+    def _refresh(self, kp_id):
+        try:
+            self.fetch(kp_id)
+        except Exception as e:
+            print(f"Error: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(kp_id)
@@ -0,0 +1,176 @@
+# Импорт необходимых библиотек
+import threading
+
+import numpy as np
+
+from models import Movie, SearchHistory, SearchResult
+
+
+# --- РЕКОМЕНДАЦИИ ---
+# Локальный движок рекомендаций без обращений к API. Каталог фильмов
+# хранится в матрицах NumPy (жанры, год, рейтинг), вкус пользователя -
+# в векторе предпочтений, а все кандидаты оцениваются одной операцией.
+class Recommender:
+    WATCHED_WEIGHT = 3.0  # Вес просмотренного фильма в профиле пользователя
+    SHOWN_WEIGHT = 1.0  # Вес фильма, который был в результатах поиска
+    GENRE_FILTER_WEIGHT = 2.0  # Вес жанра, явно выбранного в фильтре поиска
+
+    def __init__(self, capacity=1024):
+        """
+        Конструктор класса Recommender
+        capacity: Начальный размер матриц (растет удвоением)
+        """
+        self.size = 0  # Количество фильмов в каталоге
+        self.last_id = 0  # Последний загруженный Movie.id (для догрузки новых)
+        self.genre_index = {}  # Название жанра -> номер столбца
+        self.kp_ids = np.zeros(capacity, dtype=np.int64)
+        self.genres = np.zeros((capacity, 8), dtype=np.float32)  # Жанры (0/1)
+        self.genre_counts = np.ones(capacity, dtype=np.float32)  # Число жанров фильма (не меньше 1)
+        self.years = np.zeros(capacity, dtype=np.float32)  # Год (0 - не указан)
+        self.ratings = np.zeros(capacity, dtype=np.float32)  # Рейтинг KP (0 - нет)
+        self.positions = {}  # kp_id -> номер строки
+        self.lock = threading.RLock()  # refresh может менять размер матриц
+
+    def _reserve(self, rows, columns):
+        """Увеличивает матрицы, если новые фильмы или жанры не помещаются"""
+        capacity, width = self.genres.shape
+        if rows <= capacity and columns <= width:
+            return
+        while capacity < rows:
+            capacity *= 2
+        while width < columns:
+            width *= 2
+        genres = np.zeros((capacity, width), dtype=np.float32)
+        genres[:self.size, :self.genres.shape[1]] = self.genres[:self.size]
+        self.genres = genres
+        for name in ('kp_ids', 'genre_counts', 'years', 'ratings'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_rows(self, rows):
+        """Добавляет фильмы в каталог: rows - кортежи (kp_id, genres, year, rating_kp)"""
+        rows = [row for row in rows if row[0] not in self.positions]
+        if not rows:
+            return
+        # Заводим столбцы для новых жанров
+        parsed = []
+        for kp_id, genres, year, rating in rows:
+            names = [name.strip() for name in (genres or '').split(',') if name.strip()]
+            for name in names:
+                self.genre_index.setdefault(name, len(self.genre_index))
+            parsed.append([self.genre_index[name] for name in names])
+
+        start = self.size
+        self._reserve(start + len(rows), len(self.genre_index))
+        end = start + len(rows)
+        self.kp_ids[start:end] = [row[0] for row in rows]
+        self.genre_counts[start:end] = [max(len(columns), 1) for columns in parsed]
+        self.years[start:end] = [row[2] or 0 for row in rows]
+        self.ratings[start:end] = [row[3] or 0 for row in rows]
+        # Заполняем матрицу жанров одной операцией по индексам
+        row_index = np.repeat(np.arange(start, end), [len(columns) for columns in parsed])
+        column_index = [column for columns in parsed for column in columns]
+        self.genres[row_index, column_index] = 1.0
+        for position, row in enumerate(rows, start):
+            self.positions[row[0]] = position
+        self.size = end
+
+    def refresh(self):
+        """Догружает из БД фильмы, появившиеся после последней загрузки"""
+        with self.lock:
+            query = (Movie
+                     .select(Movie.id, Movie.kp_id, Movie.genres, Movie.year, Movie.rating_kp)
+                     .where(Movie.id > self.last_id)
+                     .order_by(Movie.id)
+                     .tuples())
+            rows = []
+            for movie_id, kp_id, genres, year, rating in query.iterator():
+                rows.append((kp_id, genres, year, rating))
+                self.last_id = movie_id
+            self.add_rows(rows)
+
+    def build_profile(self, weights, genres=()):
+        """
+        Вектор предпочтений пользователя
+        weights: kp_id -> вес фильма (просмотренные весят больше)
+        genres: Жанры, которые пользователь выбирал в фильтрах поиска
+        """
+        with self.lock:
+            known = [kp_id for kp_id in weights if kp_id in self.positions]
+            positions = [self.positions[kp_id] for kp_id in known]
+            affinity = np.zeros(self.genres.shape[1], dtype=np.float32)
+            year_mean, year_std = 0.0, 0.0
+            if positions:
+                w = np.array([weights[kp_id] for kp_id in known], dtype=np.float32)
+                # Взвешенная сумма жанров просмотренных и найденных фильмов
+                affinity += w @ self.genres[positions]
+                years = self.years[positions]
+                dated = years > 0
+                if dated.any():
+                    year_mean = float(np.average(years[dated], weights=w[dated]))
+                    year_std = float(np.sqrt(np.average((years[dated] - year_mean) ** 2, weights=w[dated])))
+            for name in genres:
+                if name in self.genre_index:
+                    affinity[self.genre_index[name]] += self.GENRE_FILTER_WEIGHT
+        total = affinity.sum()
+        if total:
+            affinity /= total  # Нормируем, чтобы вклад жанров был сравним с рейтингом
+        return affinity, year_mean, max(year_std, 5.0)
+
+    def score(self, affinity, year_mean, year_std):
+        """Оценка всех фильмов каталога за одну векторную операцию"""
+        # Профиль мог быть построен до появления новых жанров (столбцы только добавляются)
+        genres = self.genres[:self.size, :len(affinity)]
+        years = self.years[:self.size]
+        # Доля "любимых" жанров фильма (среднее предпочтение по его жанрам, чтобы
+        # фильмы с длинным списком жанров не получали преимущество),
+        # рейтинг 0..1 и близость года к привычному
+        genre_score = (genres @ affinity) / self.genre_counts[:self.size]
+        rating_score = self.ratings[:self.size] / 10.0
+        if year_mean:
+            year_score = np.exp(-0.5 * ((years - year_mean) / year_std) ** 2)
+            year_score[years == 0] = 0.5
+        else:
+            year_score = np.full(self.size, 0.5, dtype=np.float32)
+        return 3.0 * genre_score + rating_score + 0.5 * year_score
+
+    def top(self, affinity, year_mean, year_std, exclude=(), limit=5):
+        """kp_id лучших фильмов, кроме уже известных пользователю"""
+        with self.lock:
+            scores = self.score(affinity, year_mean, year_std)
+            excluded = [self.positions[kp_id] for kp_id in exclude if kp_id in self.positions]
+            scores[excluded] = -np.inf
+            limit = min(limit, self.size - len(excluded))
+            if limit <= 0:
+                return []
+            # argpartition находит top-k за O(n), сортируем только их
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            best = best[np.argsort(-scores[best])]
+            return [int(kp_id) for kp_id in self.kp_ids[best]]
+
+    def recommend(self, user, limit=5):
+        """Рекомендации для пользователя по его истории поиска и просмотров"""
+        self.refresh()
+        weights = {}
+        query = (SearchResult
+                 .select(Movie.kp_id, SearchResult.is_watched)
+                 .join(Movie)
+                 .switch(SearchResult)
+                 .join(SearchHistory)
+                 .where(SearchHistory.user == user)
+                 .tuples())
+        for kp_id, is_watched in query.iterator():
+            weight = self.WATCHED_WEIGHT if is_watched else self.SHOWN_WEIGHT
+            weights[kp_id] = max(weights.get(kp_id, 0), weight)
+        genres = [search.genre for search in
+                  SearchHistory.select(SearchHistory.genre)
+                  .where((SearchHistory.user == user) & SearchHistory.genre.is_null(False))]
+
+        with self.lock:
+            profile = self.build_profile(weights, genres)
+            kp_ids = self.top(*profile, exclude=weights, limit=limit)
+        # Сохраняем порядок, полученный от движка
+        movies = {movie.kp_id: movie for movie in Movie.select().where(Movie.kp_id.in_(kp_ids))}
+        return [movies[kp_id] for kp_id in kp_ids if kp_id in movies]
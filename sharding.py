@@ -0,0 +1,264 @@
+# Импорт необходимых библиотек
+import argparse
+import json
+import multiprocessing
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# --- МНОГОПРОЦЕССНЫЙ РЕЖИМ (СУПЕРВИЗОР) ---
+# Один процесс получает обновления (polling или webhook) и раздает их
+# N рабочим процессам по chat.id. Все обновления одного чата попадают
+# в один и тот же процесс, поэтому user_states и next-step обработчики
+# (они хранятся в памяти процесса) остаются согласованными.
+
+def extract_chat_id(update):
+    """Достает chat.id (или id пользователя) из сырого обновления Telegram"""
+    for key in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if key in update:
+            return update[key]['chat']['id']
+    if 'callback_query' in update:
+        call = update['callback_query']
+        # У inline-сообщений нет message, тогда шардируем по пользователю
+        if call.get('message'):
+            return call['message']['chat']['id']
+        return call['from']['id']
+    # inline_query, chosen_inline_result и прочие - по отправителю
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return 0
+
+
+def shard_for(update, workers):
+    """Номер рабочего процесса для обновления (стабилен между перезапусками)"""
+    # hash() от int детерминирован, в отличие от hash() строк
+    return hash(extract_chat_id(update)) % workers
+
+
+def bot_worker(shard, updates, acks):
+    """Рабочий процесс: обрабатывает обновления своей партиции обработчиками из main.py"""
+    from telebot import types
+    import main  # Регистрация обработчиков и создание таблиц БД
+
+    print(f"Шард {shard} запущен")
+    while True:
+        update = updates.get()
+        if update is None:  # Сигнал остановки от супервизора
+            break
+        main.bot.process_new_updates([types.Update.de_json(update)])
+        # Подтверждение: обновление передано обработчикам, повторять его не нужно
+        acks.put(update['update_id'])
+    if main.bot.threaded:
+        # close() пула telebot не дожидается задач из его очереди, поэтому
+        # сначала ждем, пока потоки разберут очередь. close() затем дождется
+        # завершения уже выполняющихся обработчиков
+        while not main.bot.worker_pool.tasks.empty():
+            time.sleep(0.1)
+        main.bot.worker_pool.close()
+
+
+class ShardSupervisor:
+    """
+    Запускает рабочие процессы, раздает им обновления и перезапускает упавшие.
+    Каждое обновление хранится у супервизора, пока рабочий процесс его не
+    подтвердит. После падения процесса неподтвержденные обновления заново
+    отправляются новому процессу (возможна повторная обработка). Обновление,
+    на котором процесс падает MAX_DELIVERIES раз, отбрасывается с записью в лог,
+    чтобы не перезапускать шард бесконечно.
+    """
+    MAX_DELIVERIES = 3
+    def __init__(self, workers, target=bot_worker, args=(), check_interval=1.0):
+        # spawn: каждый процесс открывает свое соединение с SQLite и свой сокет
+        self.ctx = multiprocessing.get_context('spawn')
+        self.workers = workers
+        self.target = target  # Функция рабочего процесса: target(shard, updates, acks, *args)
+        self.args = args
+        self.check_interval = check_interval  # Как часто проверять живость процессов
+        self.queues = [self.ctx.Queue() for _ in range(workers)]  # Обновления для шарда
+        self.acks = [self.ctx.Queue() for _ in range(workers)]  # update_id обработанных обновлений
+        # update_id -> [обновление, число попыток обработки]
+        self.unacked = [OrderedDict() for _ in range(workers)]
+        self.processes = [None] * workers
+        self.restarts = 0  # Счетчик перезапусков (для логов и бенчмарка)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._monitor = None
+
+    def _spawn(self, shard):
+        process = self.ctx.Process(
+            target=self.target,
+            args=(shard, self.queues[shard], self.acks[shard], *self.args),
+            name=f"shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+
+    def start(self):
+        for shard in range(self.workers):
+            self._spawn(shard)
+        # Фоновый поток следит за рабочими процессами и разбирает подтверждения
+        self._monitor = threading.Thread(target=self._watch, name="shard-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self):
+        last_check = time.monotonic()
+        while not self._stopping.wait(0.05):
+            with self._lock:
+                for shard in range(self.workers):
+                    self._collect_acks(shard)
+            if time.monotonic() - last_check >= self.check_interval:
+                self.check_workers()
+                last_check = time.monotonic()
+
+    def _collect_acks(self, shard):
+        """Убирает из буфера подтвержденные обновления (вызывается под self._lock)"""
+        # Супервизор - единственный читатель очереди подтверждений, поэтому
+        # ее блокировку чтения не может удерживать упавший процесс
+        while True:
+            try:
+                update_id = self.acks[shard].get_nowait()
+            except queue.Empty:
+                return
+            except Exception as e:
+                # Процесс убит во время записи подтверждения: остаток очереди не читается,
+                # соответствующие обновления будут отправлены повторно
+                print(f"Error: {e}")
+                return
+            self.unacked[shard].pop(update_id, None)
+
+    def check_workers(self):
+        """Перезапускает упавшие процессы с новыми очередями"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            for shard, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    print(f"Шард {shard} завершился с кодом {process.exitcode}, перезапуск...")
+                    process.close()
+                    self._replace_queues(shard)
+                    self._spawn(shard)
+                    self.restarts += 1
+
+    def _replace_queues(self, shard):
+        """
+        Процесс, убитый во время работы с очередью (OOM, SIGKILL), может оставить
+        ее поврежденной или с захваченной блокировкой чтения, поэтому из старой
+        очереди обновлений ничего не читаем. Новый процесс получает новые
+        очереди, а в очередь обновлений заново кладутся все неподтвержденные.
+        """
+        self._collect_acks(shard)
+        for old in (self.queues[shard], self.acks[shard]):
+            old.close()
+            old.cancel_join_thread()  # Не ждем выгрузки буфера в канал, который никто не читает
+        self.queues[shard], self.acks[shard] = self.ctx.Queue(), self.ctx.Queue()
+        unacked = self.unacked[shard]
+        # Процесс обрабатывает очередь по порядку, поэтому упасть он мог только
+        # на первом неподтвержденном обновлении: попытки считаем только для него
+        if unacked:
+            update_id, entry = next(iter(unacked.items()))
+            if entry[1] >= self.MAX_DELIVERIES:
+                print(f"Шард {shard}: обновление {update_id} отброшено после {entry[1]} попыток")
+                del unacked[update_id]
+            else:
+                entry[1] += 1
+        for update, _ in unacked.values():
+            self.queues[shard].put(update)
+        print(f"Шард {shard}: повторно отправлено неподтвержденных обновлений: {len(unacked)}")
+
+    def dispatch(self, update):
+        """Отправляет обновление в очередь нужного шарда"""
+        shard = shard_for(update, self.workers)
+        # Под блокировкой: очереди шарда могут заменяться при перезапуске
+        with self._lock:
+            self.unacked[shard][update['update_id']] = [update, 1]
+            self.queues[shard].put(update)
+
+    def stop(self, timeout=10):
+        """Мягкая остановка: процессы дообрабатывают свои очереди, по таймауту - завершение"""
+        with self._lock:
+            self._stopping.set()
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def run_polling(supervisor, token, timeout=20):
+    """Получение обновлений long polling'ом в процессе-супервизоре"""
+    from telebot import apihelper
+    offset = None
+    while True:
+        try:
+            updates = apihelper.get_updates(
+                token, offset=offset, timeout=timeout, long_polling_timeout=timeout
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            time.sleep(1)
+            continue
+        for update in updates:
+            offset = update['update_id'] + 1  # Подтверждаем получение
+            supervisor.dispatch(update)
+
+
+def run_webhook(supervisor, token, url, host, port):
+    """Получение обновлений через webhook (HTTP сервер в процессе-супервизоре)"""
+    from telebot import apihelper
+    # Секрет проверяется в каждом запросе, чтобы чужие POST'ы не попали в очереди
+    secret = secrets.token_hex(16)
+    apihelper.set_webhook(token, url=url, secret_token=secret)
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+                self.send_response(403)
+                self.end_headers()
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            supervisor.dispatch(json.loads(self.rfile.read(length)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass  # Не засоряем вывод логом каждого обновления
+
+    ThreadingHTTPServer((host, port), WebhookHandler).serve_forever()
+
+
+if __name__ == '__main__':
+    # telebot и config импортируются лениво: бенчмарк использует
+    # ShardSupervisor без токена и без установленного telebot
+    from telebot import apihelper
+    from config import TOKEN
+
+    parser = argparse.ArgumentParser(description="Запуск бота в нескольких процессах")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help="Количество рабочих процессов")
+    parser.add_argument('--webhook-url', help="Публичный URL webhook (по умолчанию polling)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8443)
+    options = parser.parse_args()
+
+    supervisor = ShardSupervisor(options.workers)
+    supervisor.start()
+    print(f"Бот запущен в {options.workers} процессах...")
+    try:
+        if options.webhook_url:
+            run_webhook(supervisor, TOKEN, options.webhook_url, options.host, options.port)
+        else:
+            apihelper.delete_webhook(TOKEN)  # getUpdates не работает при активном webhook
+            run_polling(supervisor, TOKEN)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
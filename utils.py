@@ -1,3 +1,5 @@
+import html
+
 from telebot import types
 from telebot.types import InlineKeyboardButton
 
@@ -12,6 +14,7 @@ def create_main_keyboard():
         types.KeyboardButton("Поиск по рейтингу"),
         types.KeyboardButton("Поиск по бюджету"),
         types.KeyboardButton("История поиска"),
+        types.KeyboardButton("Рекомендации"),
         types.KeyboardButton("Помощь"),
     )
     return keyboard
@@ -36,7 +39,7 @@ def create_count_keyboard():
     keyboard.add(*[types.KeyboardButton(str(i)) for i in range(1,11)])
     return keyboard
 
-def create_watch_keyboard(movie_id):
+def create_watch_keyboard(movie_id, kp_id=None):
     # Инлайн клава для отметки просмотренных фильмов
     keyboard = types.InlineKeyboardMarkup()
     # Добавляем инлайн-кнопку с callback-данными, содержащими ID фильма
@@ -44,6 +47,31 @@ def create_watch_keyboard(movie_id):
         text="Отметить как просмотренный",
         callback_data=f"watched_{movie_id}"
     ))
+    if kp_id:
+        keyboard.add(create_details_button(kp_id))
+    return keyboard
+
+def create_details_button(kp_id):
+    # Кнопка "Подробнее" с ID фильма в Kinopoisk
+    return InlineKeyboardButton(text="Подробнее", callback_data=f"details_{kp_id}")
+
+def create_details_keyboard(kp_id):
+    # Инлайн клава с кнопкой "Подробнее" для карточки фильма
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(create_details_button(kp_id))
+    return keyboard
+
+def create_similar_keyboard(movie_details):
+    # Инлайн клава со списком похожих фильмов (по кнопке - их подробности)
+    keyboard = types.InlineKeyboardMarkup()
+    # Без id кнопка не сможет загрузить подробности, такие фильмы пропускаем
+    similar = [movie for movie in movie_details.get('similarMovies') or [] if movie.get('id')]
+    for movie in similar[:5]:
+        name = movie.get('name') or movie.get('enName') or movie.get('alternativeName')
+        keyboard.add(InlineKeyboardButton(
+            text=f"{name} ({movie.get('year') or '?'})",
+            callback_data=f"details_{movie['id']}"
+        ))
     return keyboard
 
 def format_movie_info(movie_data):
@@ -83,3 +111,57 @@ def format_movie_info(movie_data):
     )
 
     return text, movie_info['poster']
+
+
+def create_inline_result(movie_data):
+    # Карточка фильма для ответа на inline-запрос (@bot название)
+    text, poster_url = format_movie_info(movie_data)
+    if isinstance(movie_data, Movie):
+        movie_id, name, year = movie_data.kp_id, movie_data.name, movie_data.year
+        rating = movie_data.rating_kp
+    else:
+        movie_id, name, year = movie_data.get('id'), movie_data.get('name'), movie_data.get('year')
+        rating = movie_data.get('rating', {}).get('kp')
+
+    return types.InlineQueryResultArticle(
+        id=str(movie_id),
+        title=f"{name or 'Название не указано'} ({year or 'Год не указан'})",
+        input_message_content=types.InputTextMessageContent(text, parse_mode="HTML"),
+        description=f"Рейтинг KP: {rating or 'Нет рейтинга'}",
+        thumbnail_url=poster_url,
+        reply_markup=create_details_keyboard(movie_id)
+    )
+
+def format_movie_details(details):
+    # Подробная карточка фильма (данные get_movie_details из кэша)
+    # Значения из API экранируем: описание может содержать символы < и &
+    def escape(value):
+        return html.escape(str(value))
+
+    persons = details.get('persons') or []
+    actors = [p.get('name') or p.get('enName') for p in persons if p.get('enProfession') == 'actor']
+    directors = [p.get('name') or p.get('enName') for p in persons if p.get('enProfession') == 'director']
+    countries = [c.get('name', '') for c in details.get('countries') or []]
+    genres = [g.get('name', '') for g in details.get('genres') or []]
+    runtime = details.get('movieLength') or details.get('seriesLength')
+    similar = [
+        f"{m.get('name') or m.get('enName') or m.get('alternativeName')} ({m.get('year') or '?'})"
+        for m in (details.get('similarMovies') or [])[:5]
+    ]
+
+    text = (
+        f"<b>{escape(details.get('name') or details.get('alternativeName') or 'Название не указано')}</b> "
+        f"({details.get('year') or 'Год не указан'})\n"
+        f"Рейтинг KP: <b>{(details.get('rating') or {}).get('kp') or 'Нет рейтинга'}</b>\n"
+        f"Жанр: <b>{escape(', '.join(genres) or 'Жанр не указан')}</b>\n"
+        f"Страна: <b>{escape(', '.join(countries) or 'Не указана')}</b>\n"
+        f"Длительность: <b>{f'{runtime} мин' if runtime else 'Не указана'}</b>\n"
+        f"Возрастной рейтинг: <b>{details.get('ageRating') or 'Не указан'}</b>\n"
+        f"Режиссер: <b>{escape(', '.join(filter(None, directors)) or 'Не указан')}</b>\n"
+        f"В ролях: {escape(', '.join(filter(None, actors[:10])) or 'Не указаны')}\n\n"
+        # Обрезаем описание, чтобы уложиться в лимит Telegram (4096 символов)
+        f"<i>{escape((details.get('description') or 'Описание отсутствует')[:2500])}</i>"
+    )
+    if similar:
+        text += "\n\n<b>Похожие фильмы:</b>\n" + escape("\n".join(similar))
+    return text